@@ -1,16 +1,20 @@
 import os
 import uuid
 import shutil
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from typing import Optional
+from datetime import datetime, timezone
 import tempfile
 
 # 既存のプログラムをインポート
-from src.analyze import generate_structured_report
-from src.schemas import AgingReport
+from src.analyze import generate_structured_report, generate_tiled_report
+from src.video import analyze_video, is_readable_video, VIDEO_EXTENSIONS
+from src.schemas import AgingReport, encode_json
+from src.store import ReportStore, DEFAULT_DB_PATH, file_hash
+from src.preprocess import MAX_TILES
 
 # FastAPIアプリケーションの初期化
 app = FastAPI(
@@ -32,6 +36,16 @@ app.add_middleware(
 TEMP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp")
 os.makedirs(TEMP_DIR, exist_ok=True)
 
+# 分析結果データベース
+store = ReportStore(os.getenv("REPORTS_DB_PATH", DEFAULT_DB_PATH))
+
+class MsgspecJSONResponse(Response):
+    """msgspecでエンコードするJSONレスポンス（AgingReportをそのまま返せる）"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return encode_json(content)
+
 @app.get("/")
 async def root():
     """APIのルートエンドポイント"""
@@ -40,6 +54,8 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "/analyze": "画像分析 (POST)",
+            "/analyze/video": "動画分析 (POST)",
+            "/reports": "分析結果の検索・集計 (GET)",
             "/health": "ヘルスチェック (GET)"
         }
     }
@@ -50,11 +66,17 @@ async def health_check():
     return {"status": "ok"}
 
 @app.post("/analyze")
-async def analyze_building(file: UploadFile = File(...)):
+def analyze_building(
+    file: UploadFile = File(...),
+    tiles: int = Query(0, ge=0, le=MAX_TILES)
+):
     """
     アップロードされた建物画像を分析し、老朽化レポートを返す
     
+    前処理とGemini APIの呼び出しに時間がかかるため、同期関数としてスレッドプールで実行する。
+    
     - **file**: 分析する建物の画像ファイル
+    - **tiles**: 原寸で切り出して分析する注目領域の数（0で無効、最大16、高解像度画像向け）
     
     Returns:
         JSON: 老朽化分析レポート
@@ -79,15 +101,26 @@ async def analyze_building(file: UploadFile = File(...)):
             print(f"画像分析を開始: {os.path.basename(temp_file_path)}")
             
             # レポートのみ生成（高速）
-            report = generate_structured_report(temp_file_path)
+            if tiles > 0:
+                report = generate_tiled_report(temp_file_path, top_k=tiles)
+            else:
+                report = generate_structured_report(temp_file_path)
+            
+            # エラー時はエラー情報をそのまま返す
+            if isinstance(report, dict):
+                os.remove(temp_file_path)
+                return report
+            
+            print(f"分析完了: 危険度「{report.danger_level}」")
             
-            print(f"分析完了: 危険度「{report.get('danger_level', '不明')}」")
+            # 分析結果データベースに登録
+            store.add_report(file.filename, report, file_hash(temp_file_path))
             
             # 一時ファイルの削除
             os.remove(temp_file_path)
             print(f"一時ファイル削除: {os.path.basename(temp_file_path)}")
             
-            return report
+            return MsgspecJSONResponse(report)
             
         except Exception as e:
             # 画像分析中のエラー
@@ -103,6 +136,128 @@ async def analyze_building(file: UploadFile = File(...)):
             detail=f"サーバーエラー: {str(e)}"
         )
 
+@app.post("/analyze/video")
+def analyze_building_video(
+    file: UploadFile = File(...),
+    sample_interval: float = Query(0.5, gt=0),
+    scene_threshold: float = Query(0.35, gt=0, le=1),
+    max_keyframes: int = Query(60, ge=1)
+):
+    """
+    アップロードされたドローン動画からキーフレームを抽出して分析し、建物単位のレポートを返す
+    
+    動画のデコードとGemini APIの呼び出しに時間がかかるため、同期関数としてスレッドプールで実行する。
+    
+    - **file**: 分析する建物の動画ファイル
+    - **sample_interval**: フレームの比較間隔（秒）
+    - **scene_threshold**: キーフレームとみなすシーン変化の閾値
+    - **max_keyframes**: 分析するキーフレームの上限（超える場合は動画全体から均等に選択）
+    
+    Returns:
+        JSON: 統合された老朽化分析レポートとキーフレームごとの結果
+    """
+    # サポートされているファイル形式の確認
+    if not file.filename.lower().endswith(VIDEO_EXTENSIONS):
+        raise HTTPException(
+            status_code=400,
+            detail="サポートされていないファイル形式です。MP4, MOV, AVI, MKV, M4Vのみ許可されています。"
+        )
+    
+    # 一時ファイルに保存（チャンク単位でコピーし、メモリに全体を載せない）
+    file_id = str(uuid.uuid4())
+    temp_file_path = os.path.join(TEMP_DIR, f"{file_id}_{file.filename}")
+    
+    try:
+        with open(temp_file_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+        
+        # 開けない・壊れた動画はクライアント側のエラー
+        if not is_readable_video(temp_file_path):
+            raise HTTPException(
+                status_code=400,
+                detail="動画を読み込めません。ファイルが破損していないか確認してください。"
+            )
+        
+        print(f"動画分析を開始: {os.path.basename(temp_file_path)}")
+        result = analyze_video(temp_file_path, sample_interval, scene_threshold, max_keyframes)
+        if result is None:
+            raise HTTPException(
+                status_code=500,
+                detail="動画分析中にエラーが発生しました"
+            )
+        
+        print(f"分析完了: キーフレーム{len(result['frames'])}枚, 危険度「{result['report'].danger_level}」")
+        
+        # 分析結果データベースに登録
+        store.add_report(file.filename, result["report"], file_hash(temp_file_path))
+        
+        return MsgspecJSONResponse({
+            "report": result["report"],
+            "keyframes_detected": result["keyframes_detected"],
+            "subsampled": result["subsampled"],
+            "frames": result["frames"]
+        })
+    finally:
+        # 一時ファイルの削除
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+            print(f"一時ファイル削除: {os.path.basename(temp_file_path)}")
+
+@app.get("/reports")
+async def list_reports(
+    danger_level: Optional[str] = Query(None, description="危険度（低/中/高）"),
+    min_crack_level: Optional[int] = Query(None, ge=0, le=5, description="ひび割れレベルの下限"),
+    max_crack_level: Optional[int] = Query(None, ge=0, le=5, description="ひび割れレベルの上限"),
+    since: Optional[datetime] = Query(None, description="この日時以降に登録されたレポート"),
+    until: Optional[datetime] = Query(None, description="この日時より前に登録されたレポート"),
+    image_hash: Optional[str] = Query(None, description="画像のSHA-256ハッシュ"),
+    image: Optional[str] = Query(None, description="画像名（拡張子の有無は問わない）"),
+    limit: int = Query(50, ge=1, le=1000, description="取得件数"),
+    offset: int = Query(0, ge=0, description="スキップする件数"),
+    before_id: Optional[int] = Query(None, description="このIDより古いレポートから取得（カーソル）")
+):
+    """
+    分析結果データベースを条件で検索し、ページ単位の結果と集計を返す
+    
+    `total`・`aggregates`は最初のページ（offset=0 かつ before_id 未指定）でのみ返す。
+    
+    Returns:
+        JSON: 条件に一致する件数・集計・レポート一覧
+    """
+    if danger_level is not None and danger_level not in ("低", "中", "高"):
+        raise HTTPException(
+            status_code=400,
+            detail="danger_levelは「低」「中」「高」のいずれかを指定してください。"
+        )
+    
+    # タイムゾーン指定のない日時はUTCとして扱う（返却するcreated_atもUTC）
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if until is not None and until.tzinfo is None:
+        until = until.replace(tzinfo=timezone.utc)
+    
+    filters = {
+        "danger_level": danger_level,
+        "min_crack_level": min_crack_level,
+        "max_crack_level": max_crack_level,
+        "since": since.timestamp() if since else None,
+        "until": until.timestamp() if until else None,
+        "image_hash": image_hash,
+        "image": image
+    }
+    # 集計は最初のページのみ（2ページ目以降は一覧だけを返す）
+    aggregates = store.aggregate(**filters) if offset == 0 and before_id is None else None
+    items = store.query(limit=limit, offset=offset, before_id=before_id, **filters)
+    
+    return MsgspecJSONResponse({
+        "total": aggregates["count"] if aggregates else None,
+        "limit": limit,
+        "offset": offset,
+        "next_before_id": items[-1]["id"] if len(items) == limit else None,
+        "aggregates": aggregates,
+        "items": items
+    })
+
 @app.on_event("startup")
 async def startup_event():
     """アプリケーション起動時の処理"""
@@ -2,26 +2,55 @@ import os
 import json
 import argparse
 from src.analyze import analyze_image
+from src.video import analyze_video
+from src.store import ReportStore, DEFAULT_DB_PATH, make_record, file_hash
+from src.schemas import dumps
+from src.export import export_store
+from src.preprocess import MAX_TILES
 
 def main():
     """メイン実行関数"""
     parser = argparse.ArgumentParser(description='画像から老朽化状態を分析')
     parser.add_argument('image_path', nargs='?', help='分析する画像のパス')
     parser.add_argument('--dir', help='分析する画像が格納されたディレクトリ')
+    parser.add_argument('--tiles', type=int, default=0, help=f'高解像度画像から原寸で切り出して分析する注目領域の数（0で無効、最大{MAX_TILES}）')
+    parser.add_argument('--video', help='分析するドローン動画のパス')
+    parser.add_argument('--sample-interval', type=float, default=0.5, help='動画フレームの比較間隔（秒）')
+    parser.add_argument('--scene-threshold', type=float, default=0.35, help='キーフレームとみなすシーン変化の閾値')
+    parser.add_argument('--max-keyframes', type=int, default=60, help='動画から分析するキーフレームの上限')
     parser.add_argument('--output-dir', help='出力ディレクトリ', default='output')
+    parser.add_argument('--db', help='分析結果データベースのパス', default=DEFAULT_DB_PATH)
+    parser.add_argument('--import-dir', help='既存の出力ディレクトリを分析結果データベースに取り込む')
+    parser.add_argument('--export', help='分析結果データベースを列指向の.npyファイルに書き出す')
     args = parser.parse_args()
 
-    if args.dir:
-        process_directory(args.dir)
+    if not 0 <= args.tiles <= MAX_TILES:
+        parser.error(f"--tiles は0〜{MAX_TILES}で指定してください")
+
+    # データベースは使用するコマンドでのみ作成・オープンする
+    if args.import_dir:
+        count = ReportStore(args.db).import_output_dir(args.import_dir)
+        print(f"{count}件のレポートを取り込みました: {args.db}")
+    elif args.export:
+        count = export_store(ReportStore(args.db), args.export)
+        print(f"{count}件のレポートを書き出しました: {args.export}")
+    elif args.video:
+        process_video(args.video, args.output_dir, args.sample_interval, args.scene_threshold, args.max_keyframes, ReportStore(args.db))
+    elif args.dir:
+        process_directory(args.dir, args.tiles, ReportStore(args.db))
     elif args.image_path:
-        process_single_image(args.image_path, args.output_dir)
+        process_single_image(args.image_path, args.output_dir, args.tiles, ReportStore(args.db))
     else:
         print("使用方法:")
         print("  単一画像: python main.py <画像パス>")
         print("  ディレクトリ: python main.py --dir <ディレクトリパス>")
+        print("  動画: python main.py --video <動画パス>")
+        print("  高解像度画像（領域分割）: python main.py <画像パス> --tiles 4")
+        print("  既存結果の取り込み: python main.py --import-dir <出力ディレクトリ>")
+        print("  列指向エクスポート: python main.py --export <出力パス.npy>")
         print("  出力ディレクトリ指定: python main.py <画像パス> --output-dir <出力ディレクトリ>")
 
-def process_directory(directory_path):
+def process_directory(directory_path, tiles=0, store=None):
     """ディレクトリ内の全画像を処理"""
     if not os.path.isdir(directory_path):
         print(f"エラー: ディレクトリが見つかりません: {directory_path}")
@@ -43,9 +72,10 @@ def process_directory(directory_path):
     # 一括処理
     results = []
     errors = []
+    records = []
     for img_path in image_files:
         print(f"\n処理中: {os.path.basename(img_path)}")
-        result = analyze_image(img_path)
+        result = analyze_image(img_path, tiles)
         if result:
             if isinstance(result, dict) and result.get("error"):
                 error_info = {
@@ -56,11 +86,12 @@ def process_directory(directory_path):
                 print(f"分析エラー: {result['message']}")
             else:
                 print("\n分析結果:")
-                print(json.dumps(result["report"], indent=2, ensure_ascii=False))
+                print(dumps(result["report"]))
                 results.append({
                     "image": os.path.basename(img_path),
                     "report": result["report"]
                 })
+                records.append(make_record(os.path.basename(img_path), result["report"], file_hash(img_path)))
     
     # 結果のサマリーを保存
     output_dir = "output"
@@ -69,18 +100,23 @@ def process_directory(directory_path):
     if results:
         summary_path = os.path.join(output_dir, "analysis_summary.json")
         with open(summary_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2, ensure_ascii=False)
+            f.write(dumps(results))
         print(f"\n分析サマリーを保存しました: {summary_path}")
     
+    # 分析結果データベースに一括登録
+    if store and records:
+        store.add_reports(records)
+        print(f"\n{len(records)}件のレポートをデータベースに登録しました: {store.db_path}")
+    
     if errors:
         error_path = os.path.join(output_dir, "analysis_errors.json")
         with open(error_path, 'w', encoding='utf-8') as f:
             json.dump(errors, f, indent=2, ensure_ascii=False)
         print(f"\nエラー情報を保存しました: {error_path}")
 
-def process_single_image(image_path, output_dir):
+def process_single_image(image_path, output_dir, tiles=0, store=None):
     """単一画像を処理"""
-    result = analyze_image(image_path)
+    result = analyze_image(image_path, tiles)
     if result:
         if isinstance(result, dict) and result.get("error"):
             print(f"\n分析エラー: {result['message']}")
@@ -88,8 +124,25 @@ def process_single_image(image_path, output_dir):
                 print(f"レスポンス: {result['response']}")
         else:
             print("\n分析結果:")
-            print(json.dumps(result["report"], indent=2, ensure_ascii=False))
+            print(dumps(result["report"]))
             print(f"\n結果を保存しました: {os.path.join(output_dir, os.path.splitext(os.path.basename(image_path))[0] + '.json')}")
+            if store:
+                store.add_report(os.path.basename(image_path), result["report"], file_hash(image_path))
+
+def process_video(video_path, output_dir, sample_interval, scene_threshold, max_keyframes, store=None):
+    """動画のキーフレームを分析し、建物単位のレポートを出力"""
+    if not os.path.isfile(video_path):
+        print(f"エラー: 動画ファイルが見つかりません: {video_path}")
+        return
+
+    result = analyze_video(video_path, sample_interval, scene_threshold, max_keyframes)
+    if result:
+        print(f"\n分析したキーフレーム数: {len(result['frames'])}（検出: {result['keyframes_detected']}）")
+        print("\n分析結果:")
+        print(dumps(result["report"]))
+        print(f"\n結果を保存しました: {os.path.join(output_dir, os.path.splitext(os.path.basename(video_path))[0] + '.json')}")
+        if store:
+            store.add_report(os.path.basename(video_path), result["report"], file_hash(video_path))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
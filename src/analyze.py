@@ -1,10 +1,12 @@
 import os
 import json
 import base64
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from PIL import Image
 import google.generativeai as genai
-from src.schemas import AgingReport
+import msgspec
+from src.schemas import AgingReport, DANGER_ORDER, decode_report, decode_tiled_report, dumps
+from src.preprocess import extract_roi_tiles
 from dotenv import load_dotenv
 
 def load_env() -> str:
@@ -50,6 +52,25 @@ def init_api():
         raise ValueError("GEMINI_API_KEYが設定されていません")
     genai.configure(api_key=API_KEY)
 
+def load_prompt() -> Dict:
+    """プロンプト定義の読み込み"""
+    prompt_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
+                              'resources', 'prompts', 'aging_check.json')
+    with open(prompt_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def extract_json_text(text: str) -> str:
+    """マークダウン形式を含むレスポンスからJSON部分を取り出す"""
+    json_text = text
+    if '```json' in json_text:
+        # マークダウンブロックを抽出
+        parts = json_text.split('```json')
+        if len(parts) > 1:
+            json_text = parts[1]
+            if '```' in json_text:
+                json_text = json_text.split('```')[0]
+    return json_text.strip()
+
 def generate_structured_report(img_path: str) -> AgingReport:
     """構造化レポート生成"""
     # 画像の前処理
@@ -59,10 +80,7 @@ def generate_structured_report(img_path: str) -> AgingReport:
     model = genai.GenerativeModel('gemini-1.5-flash')
     
     # プロンプトの読み込み
-    prompt_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                              'resources', 'prompts', 'aging_check.json')
-    with open(prompt_path, 'r', encoding='utf-8') as f:
-        prompt_data = json.load(f)
+    prompt_data = load_prompt()
     
     try:
         # APIリクエスト
@@ -72,29 +90,66 @@ def generate_structured_report(img_path: str) -> AgingReport:
             f"出力スキーマ: {json.dumps(prompt_data['output_schema'], ensure_ascii=False)}"
         ])
         
-        # マークダウン形式のJSONを処理
-        json_text = response.text
-        if '```json' in json_text:
-            # マークダウンブロックを抽出
-            parts = json_text.split('```json')
-            if len(parts) > 1:
-                json_text = parts[1]
-                if '```' in json_text:
-                    json_text = json_text.split('```')[0]
-        json_text = json_text.strip()
+        # JSONとしてパース（必要なキー・値の範囲も同時に検証）
+        return decode_report(extract_json_text(response.text))
         
-        # JSONとしてパース
-        result = json.loads(json_text)
+    except msgspec.DecodeError as e:
+        print(f"JSONパースエラー: {str(e)}")
+        print(f"レスポンス: {response.text}")
+        return {
+            "error": True,
+            "message": f"JSONパースエラー: {str(e)}",
+            "response": response.text
+        }
+    except Exception as e:
+        print(f"エラーが発生しました: {str(e)}")
+        return {
+            "error": True,
+            "message": f"エラー: {str(e)}"
+        }
+
+def generate_tiled_report(img_path: str, top_k: int = 4, tile_size: int = 768) -> AgingReport:
+    """高解像度画像の注目領域をタイル分割して分析し、1つのレポートに統合する"""
+    # エッジ・ひび割れ密度の高い領域をネイティブ解像度で切り出し
+    thumbnail, tiles = extract_roi_tiles(img_path, top_k=top_k, tile_size=tile_size)
+    
+    # モデル初期化
+    model = genai.GenerativeModel('gemini-1.5-flash')
+    
+    # プロンプトの読み込み
+    prompt_data = load_prompt()
+    report_schema = prompt_data['output_schema']
+    output_schema = {
+        "type": "object",
+        "properties": {
+            "overview": report_schema,
+            "tiles": {"type": "array", "items": report_schema, "minItems": len(tiles), "maxItems": len(tiles)}
+        },
+        "required": ["overview", "tiles"]
+    }
+    
+    # 全体サムネイルと各領域を1回のリクエストにまとめる
+    contents = [
+        prompt_data['system_prompt'],
+        prompt_data['tiled_prompt'],
+        "全体画像（縮小）:",
+        thumbnail
+    ]
+    for i, ((x, y, w, h), tile) in enumerate(tiles, 1):
+        contents.append(f"領域{i}（x={x}, y={y}, {w}x{h}px、原寸）:")
+        contents.append(tile)
+    contents.append(f"出力スキーマ: {json.dumps(output_schema, ensure_ascii=False)}")
+    
+    try:
+        # APIリクエスト
+        response = model.generate_content(contents)
         
-        # 必要なキーが存在するか確認
-        required_keys = ['crack_level', 'danger_level', 'reasons']
-        for key in required_keys:
-            if key not in result:
-                raise ValueError(f"レスポンスに必要なキー '{key}' が含まれていません")
+        # JSONとしてパース（必要なキー・値の範囲も同時に検証）
+        result = decode_tiled_report(extract_json_text(response.text))
         
-        return AgingReport(**result)
+        return merge_reports([result.overview, *result.tiles])
         
-    except json.JSONDecodeError as e:
+    except msgspec.DecodeError as e:
         print(f"JSONパースエラー: {str(e)}")
         print(f"レスポンス: {response.text}")
         return {
@@ -109,15 +164,47 @@ def generate_structured_report(img_path: str) -> AgingReport:
             "message": f"エラー: {str(e)}"
         }
 
-def analyze_image(image_path: str) -> Optional[Dict]:
-    """画像分析のメイン処理"""
+def merge_reports(reports: List[AgingReport]) -> AgingReport:
+    """複数のレポート（フレーム・領域ごと）を1つのレポートに統合する"""
+    if not reports:
+        raise ValueError("統合するレポートがありません")
+
+    # 危険度・ひび割れレベルの高い順に並べ、深刻な所見の理由を優先する
+    ranked = sorted(
+        reports,
+        key=lambda r: (DANGER_ORDER[r.danger_level], r.crack_level),
+        reverse=True
+    )
+    reasons = []
+    for report in ranked:
+        for reason in report.reasons:
+            if reason not in reasons:
+                reasons.append(reason)
+
+    return AgingReport(
+        crack_level=max(r.crack_level for r in reports),
+        danger_level=ranked[0].danger_level,
+        reasons=reasons[:2]
+    )
+
+def analyze_image(image_path: str, tiles: int = 0) -> Optional[Dict]:
+    """
+    画像分析のメイン処理
+    
+    Args:
+        image_path: 分析する画像のパス
+        tiles: 0より大きい場合、注目領域をその数だけ原寸で切り出して分析する
+    """
     try:
         # API初期化
         init_api()
         
         # レポート生成
         print(f"画像を分析中: {image_path}")
-        report = generate_structured_report(image_path)
+        if tiles > 0:
+            report = generate_tiled_report(image_path, top_k=tiles)
+        else:
+            report = generate_structured_report(image_path)
         
         # エラーチェック
         if isinstance(report, dict) and report.get("error"):
@@ -130,19 +217,12 @@ def analyze_image(image_path: str) -> Optional[Dict]:
         base_name = os.path.basename(image_path)
         json_path = os.path.join(output_dir, f"{os.path.splitext(base_name)[0]}.json")
         
-        # AgingReportを辞書に変換
-        report_dict = {
-            "crack_level": report["crack_level"],
-            "danger_level": report["danger_level"],
-            "reasons": report["reasons"]
-        }
-        
         with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(report_dict, f, ensure_ascii=False, indent=2)
+            f.write(dumps(report))
 
         return {
             "image": image_path,
-            "report": report_dict
+            "report": report
         }
     except Exception as e:
         print(f"エラー: {str(e)}")
@@ -155,6 +235,6 @@ if __name__ == "__main__":
         result = analyze_image(image_path)
         if result:
             print("\n分析結果:")
-            print(json.dumps(result["report"], indent=2, ensure_ascii=False))
+            print(dumps(result["report"]))
     else:
         print("使用法: python analyze.py <画像パス>")
\ No newline at end of file
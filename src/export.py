@@ -0,0 +1,29 @@
+import numpy as np
+from src.store import ReportStore
+
+# 列指向エクスポートの構造（危険度は 低=0, 中=1, 高=2 のコード）
+# image は64文字を超える部分が切り捨てられ、image_hash は未登録なら空
+REPORT_DTYPE = np.dtype([
+    ("id", np.int64),
+    ("image", "U64"),
+    ("image_hash", "S64"),
+    ("crack_level", np.uint8),
+    ("danger_level", np.uint8),
+    ("created_at", np.float64),
+])
+
+def store_to_array(store: ReportStore, **filters) -> np.ndarray:
+    """分析結果データベースの内容をNumPy構造化配列として取り出す"""
+    count = store.aggregate(**filters)["count"]
+    return np.fromiter(store.iter_columns(**filters), dtype=REPORT_DTYPE, count=count)
+
+def export_store(store: ReportStore, output_path: str, **filters) -> int:
+    """
+    分析結果データベースを列指向の .npy ファイルに書き出す
+
+    Returns:
+        int: 書き出した件数
+    """
+    array = store_to_array(store, **filters)
+    np.save(output_path, array)
+    return len(array)
@@ -1,7 +1,7 @@
 import os
 import cv2
 import numpy as np
-from PIL import Image, ImageEnhance
+from PIL import Image, ImageEnhance, ImageOps
 
 def resize_image(image_path, max_size=1024):
     """画像をAPIに適したサイズにリサイズする"""
@@ -49,16 +49,20 @@ def enhance_image(image_path):
     
     return output_path
 
+def compute_edge_map(gray):
+    """グレースケール画像からCannyエッジマップを計算する"""
+    # ノイズ除去
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    
+    # エッジ検出（Canny）
+    return cv2.Canny(blurred, 50, 150)
+
 def detect_edges(image_path):
     """OpenCVを使用してエッジ検出を行う（ひび割れ強調）"""
     img = cv2.imread(image_path)
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     
-    # ノイズ除去
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    
-    # エッジ検出（Canny）
-    edges = cv2.Canny(blurred, 50, 150)
+    edges = compute_edge_map(gray)
     
     # オリジナル画像とエッジを組み合わせる
     edge_highlighted = cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
@@ -72,6 +76,124 @@ def detect_edges(image_path):
     
     return output_path
 
+# 1回のリクエストで送る注目領域の上限
+MAX_TILES = 16
+
+def _tile_starts(length, tile):
+    """タイルの開始位置（端数が出る場合は末端に揃えたタイルを追加）"""
+    starts = list(range(0, length - tile + 1, tile))
+    if length % tile:
+        starts.append(length - tile)
+    return np.array(starts, dtype=np.int64)
+
+def score_tiles(gray, tile_size=768):
+    """
+    タイルごとのエッジ密度・ひび割れ密度をスコア化する
+    
+    画像の下端・右端の端数部分も、末端に揃えたタイルで評価する。
+    
+    Args:
+        gray: グレースケール画像（ネイティブ解像度）
+        tile_size: タイルの一辺（ピクセル）
+    
+    Returns:
+        tuple: (タイルスコア (行数, 列数), 各行のy開始位置, 各列のx開始位置, タイル高さ, タイル幅)
+    """
+    edges = compute_edge_map(gray)
+    
+    # ひび割れは細く暗い線として現れるため、ブラックハットで抽出
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15))
+    blackhat = cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, kernel)
+    
+    # エッジ=1、ひび割れ=+2 の重みを1枚のマップにまとめる
+    edge_mask = edges > 0
+    weights = edge_mask.astype(np.uint8)
+    weights += ((blackhat > 30) & edge_mask).astype(np.uint8) * 2
+    del edges, blackhat, edge_mask
+    
+    th = min(tile_size, gray.shape[0])
+    tw = min(tile_size, gray.shape[1])
+    ys = _tile_starts(gray.shape[0], th)
+    xs = _tile_starts(gray.shape[1], tw)
+    
+    # 行方向は帯ごとに列和を取り、列方向は累積和の差分で全タイルを一括集計
+    col_sums = np.stack([weights[y:y + th].sum(axis=0, dtype=np.int64) for y in ys])
+    cumsum = np.concatenate([np.zeros((len(ys), 1), dtype=np.int64), col_sums.cumsum(axis=1)], axis=1)
+    scores = (cumsum[:, xs + tw] - cumsum[:, xs]) / float(th * tw)
+    
+    return scores, ys, xs, th, tw
+
+def select_tiles(scores, ys, xs, th, tw, top_k, max_overlap=0.5):
+    """
+    スコアの高い順にタイルを選ぶ（スコア0のタイルと、選択済みの領域と大きく重なるタイルは除外）
+    
+    Args:
+        scores: タイルスコア (行数, 列数)
+        ys, xs: 各行・各列の開始位置
+        th, tw: タイルの高さ・幅
+        top_k: 選択する最大数
+        max_overlap: 選択済みの領域との重なり（タイル面積比）の上限
+    
+    Returns:
+        list: 領域 (x, y, w, h) のリスト（スコア順）
+    """
+    flat = scores.ravel()
+    order = np.argsort(flat, kind="stable")[::-1]
+    
+    boxes = []
+    for index in order:
+        if len(boxes) >= top_k or flat[index] <= 0:
+            break
+        row, col = divmod(int(index), scores.shape[1])
+        x, y = int(xs[col]), int(ys[row])
+        # 末端に揃えたタイルは隣のタイルと重なるため、重なりの大きいものは送らない
+        overlapped = any(
+            max(0, min(x, bx) + tw - max(x, bx)) * max(0, min(y, by) + th - max(y, by)) > max_overlap * th * tw
+            for bx, by, _, _ in boxes
+        )
+        if not overlapped:
+            boxes.append((x, y, tw, th))
+    return boxes
+
+def extract_roi_tiles(image_path, top_k=4, tile_size=768, thumbnail_size=512):
+    """
+    エッジ・ひび割れ密度の高い上位K領域をネイティブ解像度で切り出す
+    
+    Args:
+        image_path: 入力画像のパス
+        top_k: 切り出す領域数（1〜MAX_TILES）
+        tile_size: タイルの一辺（ピクセル）
+        thumbnail_size: 全体サムネイルの最大サイズ
+    
+    Returns:
+        tuple: (全体サムネイル, [(領域(x, y, w, h), 切り出し画像), ...])
+    """
+    if not 1 <= top_k <= MAX_TILES:
+        raise ValueError(f"領域数は1〜{MAX_TILES}で指定してください: {top_k}")
+    
+    gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError(f"画像を読み込めません: {image_path}")
+    
+    scores, ys, xs, th, tw = score_tiles(gray, tile_size)
+    del gray
+    
+    # スコア上位K件のタイルを選択（スコア順）
+    boxes = select_tiles(scores, ys, xs, th, tw, top_k)
+    
+    # cv2.imreadはEXIFの回転を適用するため、座標を揃える
+    img = ImageOps.exif_transpose(Image.open(image_path))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    
+    tiles = [(box, img.crop((box[0], box[1], box[0] + box[2], box[1] + box[3]))) for box in boxes]
+    
+    # 全体の位置関係を把握するための小さなサムネイル
+    thumbnail = img.copy()
+    thumbnail.thumbnail((thumbnail_size, thumbnail_size), Image.LANCZOS)
+    
+    return thumbnail, tiles
+
 def preprocess_pipeline(image_path):
     """画像前処理パイプライン"""
     # リサイズ
@@ -1,7 +1,52 @@
-from typing import TypedDict, Literal
+from typing import Literal, Any, Annotated
+import msgspec
 
-class AgingReport(TypedDict):
+# 危険度の順序（レポートの統合で使用）
+DANGER_ORDER = {"低": 0, "中": 1, "高": 2}
+
+class AgingReport(msgspec.Struct, frozen=True, gc=False):
     """老朽化レポートの構造定義"""
     crack_level: Literal[0, 1, 2, 3, 4, 5]  # ひび割れレベル（0-5）
     danger_level: Literal["低", "中", "高"]  # 危険度
-    reasons: list[str]  # 問題点リスト（最大2つ）
\ No newline at end of file
+    reasons: Annotated[list[str], msgspec.Meta(max_length=2)]  # 問題点リスト（最大2つ）
+
+class TiledReport(msgspec.Struct, frozen=True, gc=False):
+    """領域分割分析のレスポンス構造（全体＋領域ごと）"""
+    overview: AgingReport
+    tiles: list[AgingReport]
+
+class ImageReport(msgspec.Struct, frozen=True, gc=False):
+    """analysis_summary.json の1件分"""
+    image: str
+    report: AgingReport
+
+# エンコーダ・デコーダは使い回すことで生成コストを省く
+_encoder = msgspec.json.Encoder()
+_report_decoder = msgspec.json.Decoder(AgingReport)
+_tiled_decoder = msgspec.json.Decoder(TiledReport)
+_summary_decoder = msgspec.json.Decoder(list[msgspec.Raw])
+_image_report_decoder = msgspec.json.Decoder(ImageReport)
+
+def encode_json(obj: Any) -> bytes:
+    """レポート（およびそれを含む辞書・リスト）をUTF-8のJSONにエンコードする"""
+    return _encoder.encode(obj)
+
+def dumps(obj: Any, indent: int = 2) -> str:
+    """表示・ファイル保存用に整形したJSON文字列を返す"""
+    return msgspec.json.format(_encoder.encode(obj), indent=indent).decode("utf-8")
+
+def decode_report(data) -> AgingReport:
+    """JSONを検証しながらAgingReportにデコードする"""
+    return _report_decoder.decode(data)
+
+def decode_tiled_report(data) -> TiledReport:
+    """JSONを検証しながらTiledReportにデコードする"""
+    return _tiled_decoder.decode(data)
+
+def decode_summary(data) -> list[msgspec.Raw]:
+    """analysis_summary.json を要素ごとの未検証JSONに分割する（不正な要素を個別にスキップするため）"""
+    return _summary_decoder.decode(data)
+
+def decode_image_report(data) -> ImageReport:
+    """analysis_summary.json の1件を検証しながらデコードする"""
+    return _image_report_decoder.decode(data)
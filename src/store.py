@@ -0,0 +1,353 @@
+import os
+import time
+import sqlite3
+import hashlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Iterable, Iterator, Any
+import msgspec
+from src.schemas import AgingReport, encode_json, decode_report, decode_summary, decode_image_report
+
+# 分析結果データベースのデフォルトパス
+DEFAULT_DB_PATH = os.path.join("output", "reports.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    image TEXT NOT NULL,  -- 画像名（拡張子なし。output/{画像名}.json と同じキー）
+    image_hash TEXT,
+    crack_level INTEGER NOT NULL,
+    danger_level TEXT NOT NULL,
+    reasons TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reports_danger_crack ON reports (danger_level, crack_level);
+CREATE INDEX IF NOT EXISTS idx_reports_danger_id ON reports (danger_level, id);
+CREATE INDEX IF NOT EXISTS idx_reports_crack_level ON reports (crack_level);
+CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports (created_at);
+CREATE INDEX IF NOT EXISTS idx_reports_image_hash ON reports (image_hash);
+CREATE INDEX IF NOT EXISTS idx_reports_image ON reports (image);
+
+-- 危険度・ひび割れレベル別の件数（集計をテーブル全体の走査なしで返すため）
+CREATE TABLE IF NOT EXISTS report_counts (
+    danger_level TEXT NOT NULL,
+    crack_level INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (danger_level, crack_level)
+) WITHOUT ROWID;
+"""
+
+# インポート時に一度に挿入する件数
+IMPORT_BATCH_SIZE = 10000
+
+def file_hash(path: str) -> Optional[str]:
+    """ファイル内容のSHA-256ハッシュを計算する（ファイルがなければNone）"""
+    if not os.path.isfile(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def image_key(image: str) -> str:
+    """パス・ファイル名を画像名（拡張子なし）に正規化する"""
+    return os.path.splitext(os.path.basename(image))[0]
+
+def make_record(image: str, report: AgingReport, image_hash: Optional[str] = None,
+                created_at: Optional[float] = None) -> Dict[str, Any]:
+    """レポートをデータベース登録用のレコードに変換する（画像名は拡張子なしに正規化）"""
+    return {
+        "image": image_key(image),
+        "image_hash": image_hash,
+        "crack_level": report.crack_level,
+        "danger_level": report.danger_level,
+        "reasons": encode_json(report.reasons).decode("utf-8"),
+        "created_at": created_at if created_at is not None else time.time()
+    }
+
+class ReportStore:
+    """SQLiteによるインデックス付き分析結果ストア"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            has_counts = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'report_counts'"
+            ).fetchone()
+            conn.executescript(SCHEMA)
+            # 件数テーブル導入前のデータベースは既存の行から件数を作成
+            if not has_counts:
+                with conn:
+                    conn.execute(
+                        "INSERT INTO report_counts (danger_level, crack_level, n) "
+                        "SELECT danger_level, crack_level, COUNT(*) FROM reports GROUP BY danger_level, crack_level"
+                    )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def add_reports(self, records: Iterable[Dict[str, Any]]) -> int:
+        """レコードを1トランザクションで一括登録する"""
+        rows = [
+            (r["image"], r["image_hash"], r["crack_level"], r["danger_level"], r["reasons"], r["created_at"])
+            for r in records
+        ]
+        if not rows:
+            return 0
+        counts = Counter((row[3], row[2]) for row in rows)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO reports (image, image_hash, crack_level, danger_level, reasons, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                # 件数テーブルも同じトランザクションで更新
+                conn.executemany(
+                    "INSERT INTO report_counts (danger_level, crack_level, n) VALUES (?, ?, ?) "
+                    "ON CONFLICT (danger_level, crack_level) DO UPDATE SET n = n + excluded.n",
+                    [(danger_level, crack_level, n) for (danger_level, crack_level), n in counts.items()]
+                )
+        finally:
+            conn.close()
+        return len(rows)
+
+    def add_report(self, image: str, report: AgingReport, image_hash: Optional[str] = None) -> int:
+        """レポートを1件登録する"""
+        return self.add_reports([make_record(image, report, image_hash)])
+
+    @staticmethod
+    def _where(danger_level: Optional[str] = None, min_crack_level: Optional[int] = None,
+               max_crack_level: Optional[int] = None, since: Optional[float] = None,
+               until: Optional[float] = None, image_hash: Optional[str] = None,
+               image: Optional[str] = None, order_by_id: bool = False):
+        """
+        検索条件からWHERE句とパラメータを組み立てる
+
+        order_by_id=True の場合、crack_level を索引に使わせない（+crack_level）。
+        id順の一覧では (danger_level, id) の索引を順に辿り、ひび割れレベルは絞り込みとして評価する方が速い。
+        """
+        crack_column = "+crack_level" if order_by_id else "crack_level"
+        clauses = []
+        params: List[Any] = []
+        if danger_level is not None:
+            clauses.append("danger_level = ?")
+            params.append(danger_level)
+        if min_crack_level is not None:
+            clauses.append(f"{crack_column} >= ?")
+            params.append(min_crack_level)
+        if max_crack_level is not None:
+            clauses.append(f"{crack_column} <= ?")
+            params.append(max_crack_level)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if image_hash is not None:
+            clauses.append("image_hash = ?")
+            params.append(image_hash)
+        if image is not None:
+            clauses.append("image = ?")
+            params.append(image_key(image))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def query(self, limit: int = 50, offset: int = 0, before_id: Optional[int] = None,
+              **filters) -> List[Dict[str, Any]]:
+        """
+        条件に一致するレポートを新しい順に取得する
+
+        Args:
+            limit: 取得件数
+            offset: スキップする件数
+            before_id: 指定した場合、このIDより古いレポートから取得（深いページでも高速）
+            **filters: danger_level, min_crack_level, max_crack_level, since, until, image_hash, image
+
+        Returns:
+            list: レポートのリスト
+        """
+        where, params = self._where(order_by_id=True, **filters)
+        if before_id is not None:
+            where += " AND id < ?" if where else " WHERE id < ?"
+            params.append(before_id)
+        sql = (
+            "SELECT id, image, image_hash, crack_level, danger_level, reasons, created_at "
+            f"FROM reports{where} ORDER BY id DESC LIMIT ? OFFSET ?"
+        )
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params + [limit, offset]).fetchall()
+        finally:
+            conn.close()
+        return [
+            {
+                "id": row["id"],
+                "image": row["image"],
+                "image_hash": row["image_hash"],
+                "crack_level": row["crack_level"],
+                "danger_level": row["danger_level"],
+                "reasons": msgspec.json.decode(row["reasons"], type=list[str]),
+                "created_at": datetime.fromtimestamp(row["created_at"], timezone.utc).isoformat()
+            }
+            for row in rows
+        ]
+
+    def aggregate(self, **filters) -> Dict[str, Any]:
+        """
+        条件に一致するレポートの件数・危険度別件数・ひび割れレベル別件数を集計する
+
+        危険度・ひび割れレベルのみの条件では件数テーブルから返す（最大18行）。
+        """
+        where, params = self._where(**filters)
+        if all(filters.get(key) is None for key in ("since", "until", "image_hash", "image")):
+            sql = f"SELECT danger_level, crack_level, n FROM report_counts{where}"
+        else:
+            sql = (
+                f"SELECT danger_level, crack_level, COUNT(*) AS n FROM reports{where} "
+                "GROUP BY danger_level, crack_level"
+            )
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+        count = 0
+        crack_sum = 0
+        by_danger_level: Dict[str, int] = {}
+        by_crack_level: Dict[int, int] = {}
+        for row in rows:
+            n = row["n"]
+            count += n
+            crack_sum += row["crack_level"] * n
+            by_danger_level[row["danger_level"]] = by_danger_level.get(row["danger_level"], 0) + n
+            by_crack_level[row["crack_level"]] = by_crack_level.get(row["crack_level"], 0) + n
+
+        return {
+            "count": count,
+            "avg_crack_level": round(crack_sum / count, 3) if count else None,
+            "by_danger_level": by_danger_level,
+            "by_crack_level": dict(sorted(by_crack_level.items()))
+        }
+
+    def iter_columns(self, **filters) -> Iterator[tuple]:
+        """
+        条件に一致するレポートを (id, image, image_hash, crack_level, 危険度コード, created_at) のタプルで順に返す
+
+        危険度コードは 低=0, 中=1, 高=2。列指向エクスポート用に文字列の変換をSQLite側で行う。
+        image_hash が未登録の行は空文字列を返す。
+        """
+        where, params = self._where(**filters)
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "SELECT id, image, IFNULL(image_hash, ''), crack_level, "
+                "CASE danger_level WHEN '低' THEN 0 WHEN '中' THEN 1 ELSE 2 END, created_at "
+                f"FROM reports{where} ORDER BY id",
+                params
+            )
+            cursor.row_factory = None
+            yield from cursor
+        finally:
+            conn.close()
+
+    def existing_images(self, images: List[str]) -> set:
+        """指定した画像名のうち、すでに登録されているものを返す"""
+        found = set()
+        conn = self._connect()
+        try:
+            # SQLiteのパラメータ数上限を超えないよう分割して問い合わせる
+            for i in range(0, len(images), 500):
+                chunk = images[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT DISTINCT image FROM reports WHERE image IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(row["image"] for row in rows)
+        finally:
+            conn.close()
+        return found
+
+    def import_output_dir(self, output_dir: str) -> int:
+        """
+        既存の出力ディレクトリ（{画像名}.json と analysis_summary.json）を取り込む
+
+        すでにデータベースに登録されている画像名はスキップするため、繰り返し実行しても重複しない。
+
+        Returns:
+            int: 登録した件数
+        """
+        if not os.path.isdir(output_dir):
+            raise FileNotFoundError(f"ディレクトリが見つかりません: {output_dir}")
+
+        imported = 0
+        batch = []
+        stems = set()
+        summary_path = None
+
+        def flush():
+            nonlocal imported, batch
+            existing = self.existing_images([record["image"] for record in batch])
+            imported += self.add_reports(r for r in batch if r["image"] not in existing)
+            batch = []
+
+        # 個別のレポートファイル
+        for entry in os.scandir(output_dir):
+            if not entry.is_file() or not entry.name.endswith(".json"):
+                continue
+            if entry.name == "analysis_summary.json":
+                summary_path = entry.path
+                continue
+            if entry.name == "analysis_errors.json":
+                continue
+            try:
+                with open(entry.path, "rb") as f:
+                    report = decode_report(f.read())
+                stem = image_key(entry.name)
+                batch.append(make_record(stem, report, created_at=entry.stat().st_mtime))
+                stems.add(stem)
+            except msgspec.DecodeError as e:
+                print(f"読み込みをスキップしました: {entry.name} ({e})")
+                continue
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush()
+
+        # サマリーのうち個別ファイルとして存在しないものだけを追加
+        if summary_path:
+            created_at = os.path.getmtime(summary_path)
+            try:
+                with open(summary_path, "rb") as f:
+                    summary = decode_summary(f.read())
+            except msgspec.DecodeError as e:
+                print(f"読み込みをスキップしました: analysis_summary.json ({e})")
+                summary = []
+            for i, raw in enumerate(summary):
+                # 検証なしで書かれた古いサマリーもあるため、不正な要素は個別にスキップ
+                try:
+                    item = decode_image_report(raw)
+                except msgspec.DecodeError as e:
+                    print(f"読み込みをスキップしました: analysis_summary.json[{i}] ({e})")
+                    continue
+                stem = image_key(item.image)
+                if stem in stems:
+                    continue
+                batch.append(make_record(stem, item.report, created_at=created_at))
+                stems.add(stem)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    flush()
+
+        flush()
+        return imported
@@ -0,0 +1,184 @@
+import os
+import tempfile
+from typing import Iterator, Optional, Dict, List, Tuple
+import cv2
+import numpy as np
+from src.analyze import init_api, generate_structured_report, merge_reports
+from src.schemas import dumps
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.m4v')
+
+def _frame_histogram(frame: np.ndarray) -> np.ndarray:
+    """シーン比較用の軽量なHSVヒストグラムを計算する"""
+    # 縮小してから計算することでフレームあたりのコストを抑える
+    small = cv2.resize(frame, (160, 90), interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [32, 32], [0, 180, 0, 256])
+    cv2.normalize(hist, hist)
+    return hist
+
+def is_readable_video(video_path: str) -> bool:
+    """動画として開けて、先頭フレームをデコードできるか確認する"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return cap.isOpened() and cap.read()[0]
+    finally:
+        cap.release()
+
+def scan_keyframes(video_path: str, sample_interval: float = 0.5,
+                   threshold: float = 0.35) -> Tuple[List[int], float]:
+    """
+    動画をストリーミングでデコードし、シーンが変化したフレームの番号を列挙する
+
+    フレーム本体は保持せず、直前のキーフレームのヒストグラムのみを保持する。
+
+    Args:
+        video_path: 動画ファイルのパス
+        sample_interval: 比較対象とするフレームの間隔（秒）
+        threshold: キーフレームとみなすヒストグラム距離（Bhattacharyya距離）
+
+    Returns:
+        (キーフレームのフレーム番号リスト, fps)
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"動画を開けません: {video_path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    step = max(1, int(round(fps * sample_interval)))
+
+    last_hist = None
+    frame_index = -1
+    keyframes = []
+    try:
+        while True:
+            # grab()でもデコードは行われる。retrieve()は比較対象のフレームだけで色変換を行う
+            if not cap.grab():
+                break
+            frame_index += 1
+            if frame_index % step:
+                continue
+
+            ok, frame = cap.retrieve()
+            if not ok:
+                break
+
+            # 直前のキーフレームとの差分で判定（ゆっくりしたパンも累積で検出）
+            hist = _frame_histogram(frame)
+            if last_hist is not None:
+                distance = cv2.compareHist(last_hist, hist, cv2.HISTCMP_BHATTACHARYYA)
+                if distance < threshold:
+                    continue
+
+            last_hist = hist
+            keyframes.append(frame_index)
+    finally:
+        cap.release()
+
+    return keyframes, fps
+
+def select_evenly(frame_indices: List[int], max_keyframes: int) -> List[int]:
+    """キーフレームが上限を超える場合、動画全体から均等に間引く"""
+    if len(frame_indices) <= max_keyframes:
+        return frame_indices
+    picks = np.linspace(0, len(frame_indices) - 1, max_keyframes).round().astype(int)
+    return [frame_indices[i] for i in picks]
+
+def iter_frames(video_path: str, frame_indices: List[int]) -> Iterator[Tuple[int, np.ndarray]]:
+    """指定したフレーム番号のフレームのみを順に返す"""
+    wanted = set(frame_indices)
+    last = max(frame_indices, default=-1)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"動画を開けません: {video_path}")
+
+    frame_index = -1
+    try:
+        while frame_index < last:
+            if not cap.grab():
+                break
+            frame_index += 1
+            if frame_index not in wanted:
+                continue
+
+            ok, frame = cap.retrieve()
+            if not ok:
+                break
+            yield frame_index, frame
+    finally:
+        cap.release()
+
+def analyze_video(video_path: str, sample_interval: float = 0.5,
+                  threshold: float = 0.35, max_keyframes: int = 60) -> Optional[Dict]:
+    """
+    動画のキーフレームを分析し、建物単位のレポートに統合する
+
+    キーフレームが max_keyframes を超える場合は、動画の途中で打ち切らず全体から均等に選ぶ。
+    """
+    try:
+        # API初期化
+        init_api()
+
+        print(f"動画を分析中: {video_path}")
+        detected, fps = scan_keyframes(video_path, sample_interval, threshold)
+        selected = select_evenly(detected, max_keyframes)
+        if len(selected) < len(detected):
+            print(f"キーフレーム{len(detected)}枚のうち{len(selected)}枚を動画全体から均等に選択しました")
+
+        frames = []
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for frame_index, frame in iter_frames(video_path, selected):
+                timestamp = frame_index / fps
+                # キーフレームは1枚ずつ書き出して分析し、すぐに破棄する
+                frame_path = os.path.join(temp_dir, f"frame_{frame_index:08d}.jpg")
+                cv2.imwrite(frame_path, frame)
+                print(f"キーフレーム分析中: {timestamp:.1f}秒 (フレーム {frame_index})")
+                report = generate_structured_report(frame_path)
+                os.remove(frame_path)
+
+                if isinstance(report, dict) and report.get("error"):
+                    print(f"分析エラー: {report['message']}")
+                    continue
+
+                frames.append({
+                    "frame_index": frame_index,
+                    "timestamp": round(timestamp, 2),
+                    "report": report
+                })
+
+        if not frames:
+            print("分析できるキーフレームがありませんでした")
+            return None
+
+        report = merge_reports([frame["report"] for frame in frames])
+
+        # 統合結果をJSONファイルとして保存
+        output_dir = "output"
+        os.makedirs(output_dir, exist_ok=True)
+        base_name = os.path.basename(video_path)
+        json_path = os.path.join(output_dir, f"{os.path.splitext(base_name)[0]}.json")
+
+        with open(json_path, "w", encoding="utf-8") as f:
+            f.write(dumps(report))
+
+        return {
+            "video": video_path,
+            "report": report,
+            "keyframes_detected": len(detected),
+            "subsampled": len(selected) < len(detected),
+            "frames": frames
+        }
+    except Exception as e:
+        print(f"エラー: {str(e)}")
+        return None
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1:
+        result = analyze_video(sys.argv[1])
+        if result:
+            print(f"\nキーフレーム数: {len(result['frames'])}")
+            print("\n分析結果:")
+            print(dumps(result["report"]))
+    else:
+        print("使用法: python video.py <動画パス>")